@@ -1,22 +1,58 @@
 from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from pinecone import Pinecone, ServerlessSpec
-from openai import AzureOpenAI
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC as Pinecone, GRPCClientConfig
+import grpc
 import os
+import asyncio
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime 
-import uuid
+import time
+import hashlib
+import hmac
+import functools
+from abc import ABC, abstractmethod
+import base64
+import numpy as np
+from collections import OrderedDict, deque
+from itertools import islice, takewhile
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Personal Memory Assistant API")
+app = FastAPI(title="Personal Memory Assistant API", default_response_class=ORJSONResponse)
 
-# Debug storage
-debug_logs = []
+# Logging: records are handed to a queue and written out by a background
+# listener thread, so request handlers never block on stdout/stderr
+log = logging.getLogger("pma")
+log.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+log.propagate = False
+log_listener = None
+# The logger is process-wide, don't attach a second handler if this module
+# is ever imported twice
+if not log.handlers:
+    _log_queue = queue.SimpleQueue()
+    log.addHandler(QueueHandler(_log_queue))
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+    log_listener = QueueListener(_log_queue, _log_handler)
+    log_listener.start()
 
-def add_debug_log(step: str, status: str, details: str = ""):
-    """Add debug log entry"""
+# Debug storage, keeps only the last 100 logs
+debug_logs = deque(maxlen=100)
+
+def add_debug_log(step: str, status: str, details: str = "", *args):
+    """Add debug log entry, details is %-formatted with args only when the entry is kept"""
+    # Failures are always recorded, everything else only at DEBUG level
+    level = logging.WARNING if status == "FAILED" else logging.DEBUG
+    if not log.isEnabledFor(level):
+        return
+    if args:
+        details = details % args
     log_entry = {
         "timestamp": datetime.utcnow().isoformat(),
         "step": step,
@@ -24,10 +60,34 @@ def add_debug_log(step: str, status: str, details: str = ""):
         "details": details
     }
     debug_logs.append(log_entry)
-    # Keep only last 100 logs
-    if len(debug_logs) > 100:
-        debug_logs.pop(0)
-    print(f"[DEBUG] {step}: {status} - {details}")
+    log.log(level, "%s: %s - %s", step, status, details)
+
+# Cached "%Y-%m-%d" string, only re-formatted when the UTC day changes
+_last_day_key = None
+_last_day_str = ""
+
+def format_day(now: datetime) -> str:
+    """Return now as YYYY-MM-DD"""
+    global _last_day_key, _last_day_str
+    day_key = now.toordinal()
+    if day_key != _last_day_key:
+        _last_day_str = now.strftime("%Y-%m-%d")
+        _last_day_key = day_key
+    return _last_day_str
+
+# Pinecone filter for memories created today, rebuilt when the UTC day changes.
+# Shared between requests, so callers must not mutate it
+_today_filter_cache = (None, None)
+
+def today_filter() -> dict:
+    """Return the metadata filter matching memories created today"""
+    global _today_filter_cache
+    day_key = int(time.time() // 86400)
+    cached_key, cached_filter = _today_filter_cache
+    if cached_key != day_key:
+        cached_filter = {"date_created": {"$eq": format_day(datetime.utcnow())}}
+        _today_filter_cache = (day_key, cached_filter)
+    return cached_filter
 
 # Initialize Pinecone
 add_debug_log("STARTUP", "INITIALIZING", "Starting Pinecone initialization")
@@ -35,71 +95,412 @@ try:
     pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
     add_debug_log("PINECONE_INIT", "SUCCESS", "Pinecone client initialized")
 except Exception as e:
-    add_debug_log("PINECONE_INIT", "FAILED", str(e))
+    add_debug_log("PINECONE_INIT", "FAILED", "%s", e)
     raise e
 
-# Create or connect to Pinecone index
-INDEX_NAME = "personal-memory"
-DIMENSION = 1536  # text-embedding-ada-002 dimension
+# Embedding backend: "azure" (Azure OpenAI) or "st" (local sentence-transformers)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "azure").lower()
+if EMBED_BACKEND not in ("azure", "st"):
+    raise ValueError(f"Unsupported EMBED_BACKEND: {EMBED_BACKEND}")
+ST_MODEL = "all-MiniLM-L6-v2"
+# Inference runtime for the local model: "onnx" (ONNX Runtime) or "torch"
+ST_RUNTIME = os.getenv("ST_RUNTIME", "onnx").lower()
+if ST_RUNTIME not in ("onnx", "torch"):
+    raise ValueError(f"Unsupported ST_RUNTIME: {ST_RUNTIME}")
+# int8 dynamic quantization of the local model. For ONNX this picks the
+# pre-quantized export for the CPU target (the AVX2 one is uint8, hence the
+# different name), for torch any target enables it. "none" keeps full FP32 weights
+ST_ONNX_QUANTIZED_FILES = {
+    "avx512_vnni": "onnx/model_qint8_avx512_vnni.onnx",
+    "avx512": "onnx/model_qint8_avx512.onnx",
+    "avx2": "onnx/model_quint8_avx2.onnx",
+    "arm64": "onnx/model_qint8_arm64.onnx",
+}
+ST_QUANTIZE = os.getenv("ST_QUANTIZE", "avx512_vnni").lower()
+if ST_QUANTIZE != "none" and ST_QUANTIZE not in ST_ONNX_QUANTIZED_FILES:
+    raise ValueError(f"Unsupported ST_QUANTIZE: {ST_QUANTIZE}")
+
+# Create or connect to Pinecone index, one per backend since dimensions differ
+if EMBED_BACKEND == "azure":
+    INDEX_NAME = "personal-memory"
+    DIMENSION = 1536  # text-embedding-ada-002 dimension
+else:
+    INDEX_NAME = "personal-memory-minilm"
+    DIMENSION = 384  # all-MiniLM-L6-v2 dimension
 
-add_debug_log("INDEX_CHECK", "STARTING", f"Checking if index '{INDEX_NAME}' exists")
+add_debug_log("INDEX_CHECK", "STARTING", "Checking if index '%s' exists", INDEX_NAME)
 try:
     existing_indexes = [index.name for index in pc.list_indexes()]
-    add_debug_log("INDEX_LIST", "SUCCESS", f"Found {len(existing_indexes)} indexes")
+    add_debug_log("INDEX_LIST", "SUCCESS", "Found %s indexes", len(existing_indexes))
     
     if INDEX_NAME not in existing_indexes:
-        add_debug_log("INDEX_CREATE", "STARTING", f"Creating index '{INDEX_NAME}'")
-        pc.create_index(
-            name=INDEX_NAME,
-            dimension=DIMENSION,
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1")
-        )
-        add_debug_log("INDEX_CREATE", "SUCCESS", f"Index '{INDEX_NAME}' created")
+        add_debug_log("INDEX_CREATE", "STARTING", "Creating index '%s'", INDEX_NAME)
+        try:
+            pc.create_index(
+                name=INDEX_NAME,
+                dimension=DIMENSION,
+                metric="cosine",
+                spec=ServerlessSpec(cloud="aws", region="us-east-1")
+            )
+            add_debug_log("INDEX_CREATE", "SUCCESS", "Index '%s' created", INDEX_NAME)
+        except Exception as e:
+            # Workers start concurrently and race to create the index on a
+            # fresh deployment; losing that race (409 Conflict) is fine
+            if getattr(e, "status", None) != 409:
+                raise
+            add_debug_log("INDEX_EXISTS", "SUCCESS", "Index '%s' created by another worker", INDEX_NAME)
     else:
-        add_debug_log("INDEX_EXISTS", "SUCCESS", f"Index '{INDEX_NAME}' already exists")
+        add_debug_log("INDEX_EXISTS", "SUCCESS", "Index '%s' already exists", INDEX_NAME)
     
-    index = pc.Index(INDEX_NAME)
-    add_debug_log("INDEX_CONNECT", "SUCCESS", f"Connected to index '{INDEX_NAME}'")
+    # gRPC index keeps one persistent HTTP/2 channel for all requests
+    index = pc.Index(INDEX_NAME, grpc_config=GRPCClientConfig(secure=True))
+    add_debug_log("INDEX_CONNECT", "SUCCESS", "Connected to index '%s'", INDEX_NAME)
 except Exception as e:
-    add_debug_log("INDEX_SETUP", "FAILED", str(e))
+    add_debug_log("INDEX_SETUP", "FAILED", "%s", e)
     raise e
 
-# Initialize Azure OpenAI client
-add_debug_log("AZURE_INIT", "STARTING", "Initializing Azure OpenAI client")
-try:
-    azure_client = AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+azure_client = None
+
+if EMBED_BACKEND == "azure":
+    # Initialize Azure OpenAI client, the SDK is only imported when it is used
+    from openai import AsyncAzureOpenAI, BadRequestError
+    add_debug_log("AZURE_INIT", "STARTING", "Initializing Azure OpenAI client")
+    try:
+        azure_client = AsyncAzureOpenAI(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
+        )
+        add_debug_log("AZURE_INIT", "SUCCESS", "Azure OpenAI client initialized")
+    except Exception as e:
+        add_debug_log("AZURE_INIT", "FAILED", "%s", e)
+
+@functools.cache
+def get_embedder():
+    """Load the local sentence-transformers model on first use"""
+    # Imported here so startup (and the Azure backend) never pays for loading torch
+    add_debug_log("EMBEDDER_INIT", "STARTING", "Loading sentence-transformers model %s (%s)", ST_MODEL, ST_RUNTIME)
+    from sentence_transformers import SentenceTransformer
+    # The ONNX exports are fetched from the model repo, no build step needed
+    model_kwargs = {}
+    if ST_RUNTIME == "onnx" and ST_QUANTIZE != "none":
+        model_kwargs["file_name"] = ST_ONNX_QUANTIZED_FILES[ST_QUANTIZE]
+    embedder = SentenceTransformer(ST_MODEL, backend=ST_RUNTIME, model_kwargs=model_kwargs)
+    if ST_RUNTIME == "torch" and ST_QUANTIZE != "none":
+        import torch
+        transformer = embedder[0]
+        transformer.auto_model = torch.quantization.quantize_dynamic(
+            transformer.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    add_debug_log("EMBEDDER_INIT", "SUCCESS", "Model %s loaded", ST_MODEL)
+    return embedder
+
+def encode_local(texts: List[str]):
+    """Embed texts with the local model, blocking"""
+    # encode() sorts a batch by length before padding, so mixed-length
+    # batches from EmbedBatcher waste little compute on padding
+    return get_embedder().encode(
+        texts,
+        batch_size=32,
+        convert_to_numpy=True,
+        normalize_embeddings=True
     )
-    add_debug_log("AZURE_INIT", "SUCCESS", "Azure OpenAI client initialized")
-except Exception as e:
-    add_debug_log("AZURE_INIT", "FAILED", str(e))
-    azure_client = None
 
-def get_embedding(text: str, use_azure: bool = True):
-    """Get embedding for text using Azure OpenAI"""
-    add_debug_log("EMBEDDING_START", "STARTING", f"Creating embedding for text length: {len(text)}")
+EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "text-embedding-ada-002")
+EMBEDDING_MODEL = EMBEDDING_DEPLOYMENT if EMBED_BACKEND == "azure" else f"{ST_MODEL}:{ST_RUNTIME}:{ST_QUANTIZE}"
+
+# Cap in-flight Azure OpenAI calls per worker to stay clear of 429 rate limits
+AZURE_MAX_CONCURRENCY = int(os.getenv("AZURE_MAX_CONCURRENCY", 32))
+azure_semaphore = asyncio.Semaphore(AZURE_MAX_CONCURRENCY)
+
+# A single inference call spreads over every core, so each process runs one
+# batch at a time (serve.py also defaults to one worker for this backend).
+# This also keeps the first get_embedder() call from loading the model twice
+local_embed_lock = asyncio.Lock()
+
+class EmbeddingCache:
+    """In-process LRU cache of embeddings keyed by SHA-256 of the input text"""
+
+    def __init__(self, fingerprint: tuple, maxsize: int = 10000):
+        # The fingerprint (backend, model, dimension) is part of every key so
+        # a model change can never serve vectors produced by the old model
+        self.fingerprint = "|".join(str(part) for part in fingerprint)
+        self.maxsize = maxsize
+        self.exact = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.fingerprint}|{text}".encode()).hexdigest()
+
+    def get(self, text: str):
+        key = self.key(text)
+        embedding = self.exact.get(key)
+        if embedding is None:
+            self.misses += 1
+            return None
+        self.exact.move_to_end(key)
+        self.hits += 1
+        return embedding
+
+    def put(self, text: str, embedding: np.ndarray):
+        key = self.key(text)
+        self.exact[key] = embedding
+        self.exact.move_to_end(key)
+        # Evict least recently used entries
+        while len(self.exact) > self.maxsize:
+            self.exact.popitem(last=False)
+
+embedding_cache = EmbeddingCache((EMBED_BACKEND, EMBEDDING_MODEL, DIMENSION))
+
+class MicroBatcher(ABC):
+    """Coalesces concurrent submissions into batches handled by a background runner"""
+
+    def __init__(self, max_batch: int, max_wait: float, max_size: float = float("inf")):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self.queue = None
+        self.task = None
+        self.inflight = set()
+
+    def start(self):
+        if self.task is None:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self._runner())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, *self.inflight, return_exceptions=True)
+            self.task = None
+
+    async def submit(self, item):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future))
+        return await future
+
+    async def _runner(self):
+        loop = asyncio.get_running_loop()
+        carry = None
+        while True:
+            # Wait for the first item, then collect more until the batch is
+            # full (by count or size) or max_wait has passed since the first
+            # one arrived. An item that would overflow starts the next batch
+            first = carry if carry is not None else await self.queue.get()
+            carry = None
+            batch = [first]
+            size = self._size(first[0])
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                item_size = self._size(item[0])
+                if size + item_size > self.max_size:
+                    carry = item
+                    break
+                batch.append(item)
+                size += item_size
+            self._spawn(batch)
+
+    def _size(self, item) -> int:
+        """Size of an item counted against max_size"""
+        return 0
+
+    def _spawn(self, batch):
+        task = asyncio.create_task(self._dispatch(batch))
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+
+    @abstractmethod
+    async def _dispatch(self, batch):
+        """Process a batch and resolve each item's future"""
+
+class EmbedBatcher(MicroBatcher):
+    """Coalesces concurrent embedding requests into batched backend calls"""
+
+    def __init__(self, max_batch: int = 64, max_wait: float = 0.01):
+        super().__init__(max_batch, max_wait)
+
+    async def _embed(self, texts):
+        """Embed texts with the configured backend as unit-length float32 rows in input order"""
+        if EMBED_BACKEND == "st":
+            # Model inference is CPU-bound, keep it off the event loop.
+            # encode_local already returns normalized float32 rows
+            async with local_embed_lock:
+                return await asyncio.to_thread(encode_local, texts)
+        
+        # Requesting base64 explicitly makes the SDK hand back the raw
+        # float32 buffers instead of converting them to Python lists
+        async with azure_semaphore:
+            response = await azure_client.embeddings.create(
+                model=EMBEDDING_DEPLOYMENT,
+                input=texts,
+                encoding_format="base64"
+            )
+        embeddings = np.empty((len(texts), DIMENSION), dtype=np.float32)
+        for item in response.data:
+            embeddings[item.index] = np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+
+    async def _dispatch(self, batch):
+        texts = [text for text, _ in batch]
+        add_debug_log("EMBEDDING_BATCH", "STARTING", "Embedding batch of %s texts", len(texts))
+        try:
+            embeddings = await self._embed(texts)
+        except Exception as e:
+            if azure_client and isinstance(e, BadRequestError) and len(batch) > 1:
+                # One invalid input rejects the whole request; retry the texts
+                # one by one so only the offending caller sees the error
+                add_debug_log("EMBEDDING_BATCH", "FAILED", "Splitting batch after error: %s", e)
+                for item in batch:
+                    self._spawn([item])
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        add_debug_log("EMBEDDING_BATCH", "SUCCESS", "Embedded batch of %s texts", len(texts))
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                # Copy the row so a cached embedding does not keep the whole
+                # batch buffer alive; read-only since the cache shares it
+                embedding = embedding.copy()
+                embedding.flags.writeable = False
+                future.set_result(embedding)
+
+embed_batcher = EmbedBatcher()
+
+class UpsertBatcher(MicroBatcher):
+    """Coalesces concurrent vector writes into batched Pinecone upserts"""
+
+    # Pinecone rejects upsert requests over 2MB, leave room for encoding overhead
+    def __init__(self, max_batch: int = 100, max_wait: float = 0.05, max_size: int = 1536 * 1024):
+        super().__init__(max_batch, max_wait, max_size)
+
+    def _size(self, vector) -> int:
+        # Estimated wire size: 4 bytes per float32 value plus the metadata text
+        metadata_size = sum(len(key) + len(str(value).encode()) for key, value in vector["metadata"].items())
+        return len(vector["id"]) + 4 * len(vector["values"]) + metadata_size
+
+    @staticmethod
+    def _is_rejected_input(error: Exception) -> bool:
+        """Whether Pinecone rejected the request's contents rather than failing to serve it"""
+        # The gRPC client re-raises RpcErrors wrapped in its own exception,
+        # so check the whole chain
+        while error is not None:
+            if isinstance(error, grpc.Call) and error.code() == grpc.StatusCode.INVALID_ARGUMENT:
+                return True
+            if getattr(error, "status", None) == 400:
+                return True
+            error = error.__cause__ or error.__context__
+        return False
+
+    async def _dispatch(self, batch):
+        vectors = [vector for vector, _ in batch]
+        add_debug_log("UPSERT_BATCH", "STARTING", "Upserting batch of %s vectors", len(vectors))
+        try:
+            await asyncio.to_thread(index.upsert, vectors=vectors)
+        except Exception as e:
+            if self._is_rejected_input(e) and len(batch) > 1:
+                # One invalid vector (e.g. oversized metadata) rejects the
+                # whole request; retry the vectors one by one so only the
+                # offending caller sees the error. Outages and timeouts fail
+                # the batch as is rather than multiplying the load
+                add_debug_log("UPSERT_BATCH", "FAILED", "Splitting batch after error: %s", e)
+                for item in batch:
+                    self._spawn([item])
+                return
+            add_debug_log("UPSERT_BATCH", "FAILED", "%s", e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        add_debug_log("UPSERT_BATCH", "SUCCESS", "Upserted batch of %s vectors", len(vectors))
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+upsert_batcher = UpsertBatcher()
+
+async def get_embedding(text: str):
+    """Get embedding for text using the configured backend"""
+    add_debug_log("EMBEDDING_START", "STARTING", "Creating embedding for text length: %s", len(text))
+    
+    cached = embedding_cache.get(text)
+    if cached is not None:
+        add_debug_log("EMBEDDING_CACHE", "SUCCESS", "Embedding served from cache")
+        return cached
     
-    if use_azure and azure_client:
+    if EMBED_BACKEND == "st" or azure_client:
         try:
-            deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT", "text-embedding-ada-002")
-            add_debug_log("EMBEDDING_REQUEST", "STARTING", f"Using deployment: {deployment_name}")
+            add_debug_log("EMBEDDING_REQUEST", "STARTING", "Using %s model: %s", EMBED_BACKEND, EMBEDDING_MODEL)
             
-            response = azure_client.embeddings.create(
-                model=deployment_name,
-                input=text
-            )
-            add_debug_log("EMBEDDING_SUCCESS", "SUCCESS", f"Embedding created, dimension: {len(response.data[0].embedding)}")
-            return response.data[0].embedding
+            embedding = await embed_batcher.submit(text)
+            embedding_cache.put(text, embedding)
+            add_debug_log("EMBEDDING_SUCCESS", "SUCCESS", "Embedding created, dimension: %s", len(embedding))
+            return embedding
         except Exception as e:
-            add_debug_log("EMBEDDING_FAILED", "FAILED", str(e))
-            raise HTTPException(status_code=500, detail=f"Azure embedding failed: {str(e)}")
+            add_debug_log("EMBEDDING_FAILED", "FAILED", "%s", e)
+            raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
     else:
         add_debug_log("EMBEDDING_NO_CLIENT", "FAILED", "Azure OpenAI client not available")
         raise HTTPException(status_code=500, detail="Azure OpenAI is required but not configured")
 
+async def warm_up_connections():
+    """Open the Pinecone channel and warm up the embedder before the first request"""
+    try:
+        await asyncio.to_thread(index.describe_index_stats)
+        add_debug_log("WARMUP_PINECONE", "SUCCESS", "Pinecone channel opened")
+    except Exception as e:
+        add_debug_log("WARMUP_PINECONE", "FAILED", "%s", e)
+    
+    if azure_client:
+        try:
+            async with azure_semaphore:
+                await azure_client.embeddings.create(model=EMBEDDING_DEPLOYMENT, input="warmup")
+            add_debug_log("WARMUP_AZURE", "SUCCESS", "Azure OpenAI connection opened")
+        except Exception as e:
+            add_debug_log("WARMUP_AZURE", "FAILED", "%s", e)
+    
+    if EMBED_BACKEND == "st":
+        try:
+            async with local_embed_lock:
+                await asyncio.to_thread(encode_local, ["warmup"])
+            add_debug_log("WARMUP_EMBEDDER", "SUCCESS", "Local embedder ready")
+        except Exception as e:
+            add_debug_log("WARMUP_EMBEDDER", "FAILED", "%s", e)
+
+warmup_task = None
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global warmup_task
+    embed_batcher.start()
+    upsert_batcher.start()
+    # Warm up in the background so the server starts accepting requests
+    # without waiting for connections or the local model to load
+    warmup_task = asyncio.create_task(warm_up_connections())
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    if warmup_task is not None:
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
+    await embed_batcher.stop()
+    await upsert_batcher.stop()
+    if log_listener is not None:
+        log_listener.stop()
+
 # Pydantic models
 class StoreMemoryRequest(BaseModel):
     content: str
@@ -117,144 +518,186 @@ class StoreMemoryResponse(BaseModel):
     memory_id: str
     message: str
 
+class Memory(BaseModel):
+    id: str
+    content: str
+    memory_type: str
+    entities: str
+    timestamp: str
+    relevance_score: float
+
 class SearchMemoryResponse(BaseModel):
     success: bool
-    memories: List[dict]
+    memories: List[Memory]
     count: int
 
+# Minimum similarity score for a match to be returned from a search
+RELEVANCE_THRESHOLD = 0.7
+# Matches requested from Pinecone per search
+SEARCH_TOP_K = 5
+
 # Authentication dependency
-def verify_api_key(authorization: str = Header(None)):
+_API_KEY = (os.getenv("API_SECRET_KEY") or "").encode()
+
+async def verify_api_key(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing authorization header")
     
-    try:
-        scheme, token = authorization.split()
-        if scheme.lower() != "bearer":
-            raise HTTPException(status_code=401, detail="Invalid authentication scheme")
-        
-        if token != os.getenv("API_SECRET_KEY"):
-            raise HTTPException(status_code=401, detail="Invalid API key")
-            
-    except ValueError:
+    scheme, _, token = authorization.partition(" ")
+    token = token.strip()
+    if not token:
         raise HTTPException(status_code=401, detail="Invalid authorization header format")
+    
+    if scheme.lower() != "bearer":
+        raise HTTPException(status_code=401, detail="Invalid authentication scheme")
+    
+    # Constant-time comparison so response timing does not leak the key;
+    # an unset API_SECRET_KEY rejects every token
+    if not _API_KEY or not hmac.compare_digest(token.encode(), _API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid API key")
 
 @app.get("/")
 def root():
     return {"message": "Personal Memory Assistant API", "status": "running"}
 
+# The handlers below return ORJSONResponse directly, which skips re-validating
+# the already well-formed payload; response_model still documents the shape
+_STORE_MSG = "Memory stored successfully"
+
 @app.post("/api/store-memory", response_model=StoreMemoryResponse)
-def store_memory(request: StoreMemoryRequest, _: str = Depends(verify_api_key)):
-    add_debug_log("STORE_MEMORY", "STARTING", f"Storing memory of type: {request.memory_type}")
+async def store_memory(request: StoreMemoryRequest, _: str = Depends(verify_api_key)):
+    add_debug_log("STORE_MEMORY", "STARTING", "Storing memory of type: %s", request.memory_type)
     
     try:
-        # Generate unique ID for memory
-        memory_id = str(uuid.uuid4())
-        add_debug_log("MEMORY_ID", "SUCCESS", f"Generated ID: {memory_id}")
+        # Generate unique ID for memory (128 random bits as 32 hex chars)
+        memory_id = os.urandom(16).hex()
+        add_debug_log("MEMORY_ID", "SUCCESS", "Generated ID: %s", memory_id)
         
         # Create embedding for the content
         add_debug_log("EMBEDDING_CALL", "STARTING", "Calling get_embedding function")
-        embedding = get_embedding(request.content)
-        add_debug_log("EMBEDDING_RECEIVED", "SUCCESS", f"Received embedding with {len(embedding)} dimensions")
+        embedding = await get_embedding(request.content)
+        add_debug_log("EMBEDDING_RECEIVED", "SUCCESS", "Received embedding with %s dimensions", len(embedding))
         
         # Prepare metadata
+        now = datetime.utcnow()
         metadata = {
             "content": request.content,
             "memory_type": request.memory_type,
             "entities": request.entities or "",
             "priority": request.priority,
-            "timestamp": datetime.utcnow().isoformat(),
-            "date_created": datetime.utcnow().strftime("%Y-%m-%d"),
+            "timestamp": now.isoformat(),
+            "date_created": format_day(now),
         }
-        add_debug_log("METADATA_PREPARED", "SUCCESS", f"Metadata prepared for {request.memory_type}")
+        add_debug_log("METADATA_PREPARED", "SUCCESS", "Metadata prepared for %s", request.memory_type)
         
         # Store in Pinecone
-        add_debug_log("PINECONE_UPSERT", "STARTING", f"Upserting vector to Pinecone")
-        index.upsert([
-            {
-                "id": memory_id,
-                "values": embedding,
-                "metadata": metadata
-            }
-        ])
-        add_debug_log("PINECONE_UPSERT", "SUCCESS", f"Vector stored successfully")
+        add_debug_log("PINECONE_UPSERT", "STARTING", "Upserting vector to Pinecone")
+        # Queued and sent together with other concurrent writes
+        await upsert_batcher.submit({
+            "id": memory_id,
+            "values": embedding.tolist(),
+            "metadata": metadata
+        })
+        add_debug_log("PINECONE_UPSERT", "SUCCESS", "Vector stored successfully")
         
-        add_debug_log("STORE_MEMORY", "SUCCESS", f"Memory {memory_id} stored successfully")
-        return StoreMemoryResponse(
-            success=True,
-            memory_id=memory_id,
-            message="Memory stored successfully"
-        )
+        add_debug_log("STORE_MEMORY", "SUCCESS", "Memory %s stored successfully", memory_id)
+        return ORJSONResponse({
+            "success": True,
+            "memory_id": memory_id,
+            "message": _STORE_MSG
+        })
         
     except Exception as e:
-        add_debug_log("STORE_MEMORY", "FAILED", str(e))
+        add_debug_log("STORE_MEMORY", "FAILED", "%s", e)
         raise HTTPException(status_code=500, detail=f"Error storing memory: {str(e)}")
 
 @app.post("/api/search-memory", response_model=SearchMemoryResponse)
-def search_memory(request: SearchMemoryRequest, _: str = Depends(verify_api_key)):
-    add_debug_log("SEARCH_MEMORY", "STARTING", f"Searching for: {request.query}")
+async def search_memory(request: SearchMemoryRequest, _: str = Depends(verify_api_key)):
+    add_debug_log("SEARCH_MEMORY", "STARTING", "Searching for: %s", request.query)
     
     try:
         # Create embedding for search query
         add_debug_log("SEARCH_EMBEDDING", "STARTING", "Creating embedding for search query")
-        query_embedding = get_embedding(request.query)
+        query_embedding = await get_embedding(request.query)
         add_debug_log("SEARCH_EMBEDDING", "SUCCESS", "Query embedding created")
         
-        # Build filter
-        filter_dict = {}
-        if request.memory_type:
-            filter_dict["memory_type"] = {"$eq": request.memory_type}
-            add_debug_log("FILTER_TYPE", "SUCCESS", f"Added memory_type filter: {request.memory_type}")
-            
+        # Build filter, left as None when the request has no filters
+        filter_dict = None
+        
         # Time-based filtering
-        if request.time_range:
-            today = datetime.utcnow().strftime("%Y-%m-%d")
-            if "today" in request.time_range.lower():
-                filter_dict["date_created"] = {"$eq": today}
-                add_debug_log("FILTER_TIME", "SUCCESS", f"Added date filter: {today}")
+        if request.time_range and "today" in request.time_range.lower():
+            filter_dict = today_filter()
+            add_debug_log("FILTER_TIME", "SUCCESS", "Added date filter: %s", filter_dict["date_created"]["$eq"])
         
-        add_debug_log("PINECONE_QUERY", "STARTING", f"Querying Pinecone with filters: {filter_dict}")
+        if request.memory_type:
+            # Copy rather than update so the cached date filter stays intact
+            filter_dict = {**(filter_dict or {}), "memory_type": {"$eq": request.memory_type}}
+            add_debug_log("FILTER_TYPE", "SUCCESS", "Added memory_type filter: %s", request.memory_type)
+        
+        add_debug_log("PINECONE_QUERY", "STARTING", "Querying Pinecone with filters: %s", filter_dict)
         # Search in Pinecone
-        search_results = index.query(
-            vector=query_embedding,
-            top_k=5,
+        search_results = await asyncio.to_thread(
+            index.query,
+            vector=query_embedding.tolist(),
+            top_k=SEARCH_TOP_K,
             include_metadata=True,
-            filter=filter_dict if filter_dict else None
+            filter=filter_dict
         )
-        add_debug_log("PINECONE_QUERY", "SUCCESS", f"Found {len(search_results['matches'])} raw matches")
+        add_debug_log("PINECONE_QUERY", "SUCCESS", "Found %s raw matches", len(search_results['matches']))
         
-        # Format results
-        memories = []
-        for match in search_results["matches"]:
-            if match["score"] > 0.7:  # Relevance threshold
-                memory = {
-                    "id": match["id"],
-                    "content": match["metadata"]["content"],
-                    "memory_type": match["metadata"]["memory_type"],
-                    "entities": match["metadata"]["entities"],
-                    "timestamp": match["metadata"]["timestamp"],
-                    "relevance_score": match["score"]
-                }
-                memories.append(memory)
+        # Format results. Matches come back sorted by descending score, so
+        # stop at the first one below the relevance threshold
+        memories = [
+            {
+                "id": match["id"],
+                "content": metadata["content"],
+                "memory_type": metadata["memory_type"],
+                "entities": metadata["entities"],
+                "timestamp": metadata["timestamp"],
+                "relevance_score": score
+            }
+            for match in takewhile(lambda match: match["score"] > RELEVANCE_THRESHOLD, search_results["matches"])
+            for score, metadata in ((match["score"], match["metadata"]),)
+        ]
         
-        add_debug_log("SEARCH_MEMORY", "SUCCESS", f"Returning {len(memories)} memories above 0.7 threshold")
-        return SearchMemoryResponse(
-            success=True,
-            memories=memories,
-            count=len(memories)
-        )
+        add_debug_log("SEARCH_MEMORY", "SUCCESS", "Returning %s memories above %s threshold", len(memories), RELEVANCE_THRESHOLD)
+        return ORJSONResponse({
+            "success": True,
+            "memories": memories,
+            "count": len(memories)
+        })
         
     except Exception as e:
-        add_debug_log("SEARCH_MEMORY", "FAILED", str(e))
+        add_debug_log("SEARCH_MEMORY", "FAILED", "%s", e)
         raise HTTPException(status_code=500, detail=f"Error searching memories: {str(e)}")
 
+# Health results are reused for a few seconds so frequent liveness probes
+# do not each cost a Pinecone round-trip
+HEALTH_CACHE_SECONDS = 5
+_health_cache = (0.0, None)
+_health_lock = asyncio.Lock()
+
 @app.get("/api/health")
-def health_check():
+async def health_check():
+    global _health_cache
+    checked_at, health = _health_cache
+    if health is None or time.monotonic() - checked_at >= HEALTH_CACHE_SECONDS:
+        # Only one request refreshes, the others wait and reuse its result
+        async with _health_lock:
+            checked_at, health = _health_cache
+            if health is None or time.monotonic() - checked_at >= HEALTH_CACHE_SECONDS:
+                health = await check_health()
+                _health_cache = (time.monotonic(), health)
+    return ORJSONResponse(health, headers={"Cache-Control": f"max-age={HEALTH_CACHE_SECONDS}"})
+
+async def check_health():
+    """Check Pinecone connectivity and return the health payload"""
     add_debug_log("HEALTH_CHECK", "STARTING", "Checking system health")
     try:
         # Test Pinecone connection
         add_debug_log("HEALTH_PINECONE", "STARTING", "Testing Pinecone connection")
-        stats = index.describe_index_stats()
-        add_debug_log("HEALTH_PINECONE", "SUCCESS", f"Pinecone connected, {stats['total_vector_count']} vectors")
+        stats = await asyncio.to_thread(index.describe_index_stats)
+        add_debug_log("HEALTH_PINECONE", "SUCCESS", "Pinecone connected, %s vectors", stats['total_vector_count'])
         
         add_debug_log("HEALTH_CHECK", "SUCCESS", "All systems healthy")
         return {
@@ -265,7 +708,7 @@ def health_check():
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
-        add_debug_log("HEALTH_CHECK", "FAILED", str(e))
+        add_debug_log("HEALTH_CHECK", "FAILED", "%s", e)
         return {
             "status": "unhealthy", 
             "error": str(e),
@@ -279,16 +722,18 @@ def get_debug_logs():
     """Get debug logs for troubleshooting"""
     return {
         "total_logs": len(debug_logs),
-        "latest_logs": debug_logs[-20:],  # Last 20 logs
+        "latest_logs": list(islice(debug_logs, max(0, len(debug_logs) - 20), None)),  # Last 20 logs
         "system_status": {
             "pinecone_initialized": 'pc' in globals(),
             "azure_client_available": azure_client is not None,
+            "embed_backend": EMBED_BACKEND,
+            "embedding_model": EMBEDDING_MODEL,
             "index_name": INDEX_NAME,
-            "dimension": DIMENSION
+            "dimension": DIMENSION,
+            "embedding_cache": {
+                "size": len(embedding_cache.exact),
+                "hits": embedding_cache.hits,
+                "misses": embedding_cache.misses
+            }
         }
     }
-
-if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
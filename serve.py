@@ -0,0 +1,32 @@
+import os
+import uvicorn
+from dotenv import load_dotenv
+
+# Production entry point. Kept separate from main.py so that starting the
+# server never runs main.py's module-level setup (Pinecone, Azure, logging)
+# twice: uvicorn imports "main:app" itself, and spawned workers re-run the
+# launching script before importing it
+
+load_dotenv()
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 8000))
+    # The local embedder's inference already uses every core and each
+    # worker would load its own copy of the model, so it defaults to one
+    # worker; Azure embeddings are I/O-bound and scale with one per core
+    if os.getenv("EMBED_BACKEND", "azure").lower() == "st":
+        default_workers = 1
+    else:
+        default_workers = os.cpu_count() or 1
+    # Multiple workers need the app as an import string; "auto" picks
+    # uvloop and httptools whenever they are installed
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=int(os.getenv("WORKERS", default_workers)),
+        loop="auto",
+        http="auto",
+        log_level="warning",
+        access_log=False
+    )